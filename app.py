@@ -1,14 +1,19 @@
+import asyncio
+import queue
+import threading
+from typing import Callable
 import streamlit as st
-from dotenv import load_dotenv
-from supervisor_agent import fmcg_supervisor_agent
+from config import get_settings
 from langchain_core.globals import set_debug
 from langchain_core.callbacks.stdout import StdOutCallbackHandler
 from pdf_utils import build_pdf_bytes
+from mas_utils import render_allocation_markdown
 from datetime import datetime
+from cachetools import TTLCache
 
 debug_handler = StdOutCallbackHandler()
 set_debug(False)
-load_dotenv()
+get_settings()  # load .env sekali, sebelum agent dibangun
 
 st.set_page_config(
     page_title="FMCG Allocation Decision Agent",
@@ -17,6 +22,20 @@ st.set_page_config(
 
 st.title("📊 FMCG Allocation Decision Agent")
 
+
+@st.cache_resource
+def get_supervisor():
+    """
+    Satu instance supervisor (+ model, Tavily, sub-agent) per proses.
+    Import di dalam fungsi supaya tidak dibangun ulang tiap rerun Streamlit.
+    """
+    from supervisor_agent import build_supervisor
+    return build_supervisor()
+
+
+# Jumlah pesan terakhir yang disimpan & di-render ulang tiap rerun
+MAX_HISTORY = 20
+
 # Session State
 if "messages" not in st.session_state:
     st.session_state.messages = []
@@ -61,16 +80,14 @@ else:
 
 st.sidebar.header("⚙️ MAS Weight Settings")
 
+# Bobot fallback (w_d, w_e, w_c) kalau semua slider di-set 0
+DEFAULT_WEIGHTS = (0.4, 0.3, 0.3)
+
 wd_raw = st.sidebar.slider("Demand weight (w_d)", 0.0, 1.0, 0.4, 0.05)
 we_raw = st.sidebar.slider("Economic weight (w_e)", 0.0, 1.0, 0.3, 0.05)
 wc_raw = st.sidebar.slider("Cost weight (w_c)", 0.0, 1.0, 0.3, 0.05)
 total_w = wd_raw + we_raw + wc_raw
-if total_w == 0:
-    wd, we, wc = 0.4, 0.3, 0.3
-else:
-    wd = wd_raw / total_w
-    we = we_raw / total_w
-    wc = wc_raw / total_w
+wd, we, wc = (wd_raw / total_w, we_raw / total_w, wc_raw / total_w) if total_w else DEFAULT_WEIGHTS
 
 st.sidebar.markdown(
     f"""
@@ -89,13 +106,6 @@ Contoh prompt:
 """
 )
 
-# Chat history
-
-for msg in st.session_state.messages:
-    with st.chat_message(msg["role"]):
-        st.markdown(msg["content"])
-
-
 def extract_text_from_last_message(result_dict) -> str:
     if "messages" not in result_dict or not result_dict["messages"]:
         return "Tidak ada respon dari agent."
@@ -107,17 +117,152 @@ def extract_text_from_last_message(result_dict) -> str:
         return content
 
     if isinstance(content, list):
-        texts = []
-        for block in content:
-            if isinstance(block, dict) and "text" in block:
-                texts.append(block["text"])
-            else:
-                texts.append(str(block))
+        # Hanya blok text; payload tool / reasoning tidak masuk ke transcript
+        texts = [
+            block["text"]
+            for block in content
+            if isinstance(block, dict) and block.get("type") == "text"
+        ]
         return "\n".join(texts)
 
     return str(content)
 
 
+@st.cache_resource
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Satu event loop long-lived (background thread) untuk semua agent call.
+    shared_state.http_async_client dipakai satu proses dan koneksinya terikat ke
+    loop tempat dibuka; asyncio.run() per pertanyaan bikin loop baru, sehingga
+    pertanyaan berikutnya gagal ("Event loop is closed").
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="agent-loop", daemon=True).start()
+    return loop
+
+
+async def stream_supervisor(agent, question: str, model_mode: str, report: Callable[[str], None]) -> dict:
+    """
+    Jalankan supervisor via .astream(stream_mode="updates") dan kirim progress
+    lewat `report` begitu tiap step selesai, bukan menunggu seluruh agent loop.
+    Return dict mirip hasil .ainvoke(): {"messages": [...], "structured_response": ...}.
+    """
+    result = {"messages": [], "structured_response": None}
+    pending_regions = {}
+
+    async for update in agent.astream(
+        {
+            "messages": [
+                {"role": "user", "content": question}
+            ]
+        },
+        config={
+            "callbacks" : [debug_handler],
+            "tags" : ["fmcg_agent", "streamlit"]
+        },
+        context={"mode": model_mode},
+        stream_mode="updates",
+    ):
+        for node_update in update.values():
+            if not node_update:
+                continue
+            messages = node_update.get("messages", [])
+            result["messages"].extend(messages)
+            if node_update.get("structured_response") is not None:
+                result["structured_response"] = node_update["structured_response"]
+
+            # Hanya get_macro_profile; tool lain (mis. structured output ToolStrategy)
+            # tidak punya argumen region
+            for msg in messages:
+                for call in getattr(msg, "tool_calls", None) or []:
+                    if call["name"] != "get_macro_profile":
+                        continue
+                    region = call["args"].get("region", "?")
+                    pending_regions[call["id"]] = region
+                    report(f"🔎 Mengambil macro profile: {region}")
+                if getattr(msg, "type", "") == "tool" and msg.name == "get_macro_profile":
+                    region = pending_regions.get(msg.tool_call_id, msg.name)
+                    report(f"✅ Macro profile {region} selesai")
+
+    return result
+
+
+@st.cache_resource
+def get_analysis_cache() -> TTLCache:
+    """
+    Cache hasil supervisor per (pertanyaan, model_mode), sengaja TANPA bobot MAS:
+    geser slider cukup hitung ulang MAS secara lokal, tanpa LLM call.
+    (Bukan st.cache_data: progress streaming di bawah tidak bisa di-replay.)
+    """
+    return TTLCache(maxsize=256, ttl=3600)
+
+
+@st.cache_resource
+def get_analysis_cache_lock() -> threading.Lock:
+    """TTLCache tidak thread-safe, sedangkan tiap session Streamlit jalan di thread sendiri."""
+    return threading.Lock()
+
+
+def run_analysis(question: str, model_mode: str) -> dict:
+    """Jalankan supervisor (atau ambil dari cache) dan kembalikan skor D/E/C terstruktur per region."""
+    cache, lock = get_analysis_cache(), get_analysis_cache_lock()
+    key = (question, model_mode)
+    # Satu .get(): cek `in` lalu [] bisa KeyError kalau entry expired di antaranya
+    with lock:
+        cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    # Agent + tools async: macro profile per region jalan concurrent di event loop agent
+    events: queue.Queue = queue.Queue()
+    future = asyncio.run_coroutine_threadsafe(
+        stream_supervisor(get_supervisor(), question, model_mode, events.put),
+        get_event_loop(),
+    )
+
+    try:
+        with st.status("Mengumpulkan data makro, menghitung MAS & alokasi...", expanded=True) as status:
+            # Elemen Streamlit hanya boleh ditulis dari script thread
+            while not (future.done() and events.empty()):
+                try:
+                    status.write(events.get(timeout=0.1))
+                except queue.Empty:
+                    pass
+            result = future.result()
+            status.update(label="Data makro & skor region siap", state="complete", expanded=False)
+    finally:
+        # Rerun / stop di tengah polling: hentikan juga agent di event loop,
+        # jangan biarkan jalan terus tanpa ada yang menyimpan hasilnya
+        if not future.done():
+            future.cancel()
+
+    structured = result.get("structured_response")
+    if structured is None:
+        return {"content": extract_text_from_last_message(result)}
+
+    reply = {"analysis": structured.model_dump()}
+    with lock:
+        cache[key] = reply
+    return reply
+
+
+def message_markdown(msg: dict) -> str:
+    """
+    Jawaban assistant terstruktur (hanya yang terakhir) di-render ulang dengan
+    bobot slider saat ini; pesan lain sudah berupa markdown final.
+    """
+    if "analysis" in msg:
+        return render_allocation_markdown(msg["analysis"], wd, we, wc)
+    return msg["content"]
+
+
+# Chat history
+
+for msg in st.session_state.messages:
+    with st.chat_message(msg["role"]):
+        st.markdown(message_markdown(msg))
+
+
 user_input = st.chat_input("Tanya tentang alokasi FMCG di suatu negara/region...")
 
 if user_input:
@@ -127,7 +272,11 @@ if user_input:
                 st.warning("Belum ada jawaban yang bisa disimpan ke PDF.")
         else:
             filename = f"fmcg_report_{datetime.now().strftime('%d-%m-%Y %H:%M:%S')}.pdf"
-            pdf_bytes = build_pdf_bytes(st.session_state.last_answer, title="FMCG Market Allocation Report")
+            with st.spinner("Menyiapkan PDF..."):
+                pdf_bytes = build_pdf_bytes(
+                    message_markdown(st.session_state.last_answer),
+                    title="FMCG Market Allocation Report",
+                )
 
             with st.chat_message("assistant"):
                 st.success(f"PDF sudah siap di-download.")
@@ -143,53 +292,19 @@ if user_input:
         with st.chat_message("user"):
             st.markdown(user_input)
 
-        # Bangun prompt yang sudah mengandung info bobot MAS
-        mas_instruction = f"""
-    Please use the following MAS (Market Allocation Score) weights
-    when computing scores for each region:
-
-    - Demand weight w_d = {wd:.3f}
-    - Economic weight w_e = {we:.3f}
-    - Cost weight w_c = {wc:.3f}
-
-    Use the formula:
-
-    MAS_r = (D_r * w_d) + (E_r * w_e) + (C_r * w_c)
-
-    After computing MAS_r for each region, convert them into allocation proportions:
-
-    Allocation_r = MAS_r / sum_over_regions(MAS)
-
-    Return a markdown table with:
-    Region | Demand Factor(D_r) | Economic Factor(E_r) | Cost Factor(C_r) | MAS_r | Allocation_share
-
-    and a short explanation.
-    """
-
-        full_user_message = user_input + "\n\n" + mas_instruction
-
-        # Panggil agent
+        # Panggil agent (bobot MAS tidak dikirim ke LLM, dihitung lokal)
         with st.chat_message("assistant"):
-            with st.spinner("Mengumpulkan data makro, menghitung MAS & alokasi..."):
-                result = fmcg_supervisor_agent.invoke(
-                    {
-                        "messages": [
-                            {"role": "user", "content": full_user_message}
-                        ]
-                    },
-                    config={
-                        "callbacks" : [debug_handler],
-                        "tags" : ["fmcg_agent", "streamlit"]
-                    },
-                    context={"mode": st.session_state["model_mode"]},
-                )
-
-            answer = extract_text_from_last_message(result)
-            st.markdown(answer)
+            reply = run_analysis(user_input.strip(), st.session_state["model_mode"])
 
-        st.session_state.messages.append(
-            {"role": "assistant", "content": answer}
-        )
-        st.session_state.last_answer = answer
+            st.markdown(message_markdown(reply))
 
+        # Jawaban sebelumnya dibekukan (markdown dengan bobot saat ini); hanya jawaban
+        # terakhir yang di-render ulang tiap rerun / tiap slider digeser.
+        for old_msg in st.session_state.messages:
+            if "analysis" in old_msg:
+                old_msg["content"] = message_markdown(old_msg)
+                del old_msg["analysis"]
 
+        st.session_state.messages.append({"role": "assistant", **reply})
+        st.session_state.messages = st.session_state.messages[-MAX_HISTORY:]
+        st.session_state.last_answer = reply
@@ -0,0 +1,29 @@
+# config.py
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+
+from dotenv import load_dotenv
+
+
+@dataclass(frozen=True)
+class Settings:
+    openai_api_key: str | None
+    tavily_api_key: str | None
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    Satu-satunya tempat load_dotenv() + baca env.
+    Di-cache, jadi .env cuma dibaca sekali per proses.
+    """
+    load_dotenv()
+    return Settings(
+        openai_api_key=os.environ.get("OPEN_AI_API_KEY"),
+        tavily_api_key=os.environ.get("TAVILY_API_KEY"),
+    )
+
+
+OPENAI_API_KEY = get_settings().openai_api_key
+TAVILY_API_KEY = get_settings().tavily_api_key
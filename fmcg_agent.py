@@ -3,13 +3,12 @@ from langchain.chat_models import init_chat_model
 from langchain_openai import ChatOpenAI
 from langchain_tavily import TavilySearch
 from langchain.agents import create_agent
-from dotenv import load_dotenv
+from typing import List
+from pydantic import BaseModel, Field
 
 from shared_state import choose_model, thinking_model, standard_model
-import os
-load_dotenv()
-OPENAI_API_KEY = os.environ.get("OPEN_AI_API_KEY")
-TAVILY_API_KEY = os.environ.get("TAVILY_API_KEY")
+import asyncio
+from config import OPENAI_API_KEY, TAVILY_API_KEY
 
 # 1. Shared model
 # model = init_chat_model("gpt-4.1", model_provider="openai", temperature=0, api_key=OPENAI_API_KEY)
@@ -22,10 +21,11 @@ TAVILY_API_KEY = os.environ.get("TAVILY_API_KEY")
 
 
 # 2. Shared Tavily tool (bisa juga bikin 2: general + finance/news)
+# "basic" jauh lebih cepat dari "advanced"; coverage dijaga lewat beberapa query paralel
 tavily_search = TavilySearch(
-    max_results=5,
+    max_results=3,
     topic="general",
-    search_depth="advanced",
+    search_depth="basic",
     api_key=TAVILY_API_KEY
 )
 
@@ -89,51 +89,100 @@ Task:
 - Explain how urbanization level affects per capita FMCG consumption and modern trade vs general trade.
 """
 
-# 4. Build agents
-gdp_agent = create_agent(
-    standard_model,
-    tools=[tavily_search],
-    system_prompt=GDP_PROMPT,
-    name='gdp_agent',
-    middleware=[choose_model]
-)
+MACRO_PROFILE_PROMPT = f"""
+You are a macro analyst building a complete FMCG macro profile for ONE region/country
+in a single response. Cover all six areas below (one section per role):
+
+[GDP]
+{GDP_PROMPT}
+[INFLATION]
+{INFLATION_PROMPT}
+[FUEL]
+{FUEL_PROMPT}
+[SENTIMENT]
+{SENTIMENT_PROMPT}
+[POPULATION]
+{POP_PROMPT}
+[URBANIZATION]
+{URBAN_PROMPT}
+Search strategy:
+- The user message may already contain pre-fetched search results for well-scoped metrics
+  (GDP, inflation, fuel, population, urbanization). Use them directly and do not search
+  again for an area they already cover.
+- For areas that are missing or thin (typically consumer sentiment), emit several (e.g. 2-4)
+  Tavily searches in a single assistant turn as parallel tool calls,
+  each with a different, specific query (source or year in the query helps), e.g.
+  "Malaysia consumer sentiment index 2025", "Malaysia MIER consumer confidence".
+- Only search again if an area is still missing after the first batch.
+Return the structured response with one entry per area plus the list of source URLs.
+"""
 
-inflation_agent = create_agent(
-    standard_model,
-    tools=[tavily_search],
-    system_prompt=INFLATION_PROMPT,
-    name='inflation_agent',
-    middleware=[choose_model]
-)
 
-fuel_agent = create_agent(
-    standard_model,
-    tools=[tavily_search],
-    system_prompt=FUEL_PROMPT,
-    name='fuel_agent',
-    middleware=[choose_model]
-)
+# 4. Structured output: satu JSON untuk keenam metric
+class MetricContext(BaseModel):
+    summary: str = Field(description="Latest figures, trend and data year")
+    fmcg_implication: str = Field(description="What this implies for FMCG demand / cost")
 
-sentiment_agent = create_agent(
-    standard_model,
-    tools=[tavily_search],
-    system_prompt=SENTIMENT_PROMPT,
-    name='sentiment_agent',
-    middleware=[choose_model]
-)
 
-population_agent = create_agent(
-    standard_model,
-    tools=[tavily_search],
-    system_prompt=POP_PROMPT,
-    name='population_agent',
-    middleware=[choose_model]
-)
+class MacroProfile(BaseModel):
+    region: str
+    gdp: MetricContext
+    inflation: MetricContext
+    fuel: MetricContext
+    sentiment: MetricContext
+    population: MetricContext
+    urbanization: MetricContext
+    sources: List[str] = Field(description="High quality source URLs")
 
-urbanization_agent = create_agent(
+
+# 5. Build agent: satu LLM call chain per region, bukan enam
+macro_profile_agent = create_agent(
     standard_model,
     tools=[tavily_search],
-    system_prompt=URBAN_PROMPT,
-    name='urbanization_agent',
+    system_prompt=MACRO_PROFILE_PROMPT,
+    response_format=MacroProfile,
+    name='macro_profile_agent',
     middleware=[choose_model]
 )
+
+
+# 6. Fast path retrieval: metric yang well-scoped cukup Tavily langsung (tanpa LLM),
+#    hasilnya dikirim ke macro_profile_agent supaya dia tidak perlu tool-call round trip.
+#    Sentiment sengaja tidak di-prefetch (butuh sintesis, biar agent yang search).
+PREFETCH_QUERIES = {
+    "gdp": "{region} GDP growth latest IMF World Bank",
+    "inflation": "{region} CPI inflation rate latest",
+    "fuel": "{region} retail diesel petrol price latest",
+    "population": "{region} population growth density latest",
+    "urbanization": "{region} urbanization rate urban population percent",
+}
+
+
+async def prefetch_macro_snippets(region: str, max_hits: int = 3) -> str:
+    """
+    Jalankan semua PREFETCH_QUERIES secara concurrent dan format hasilnya jadi
+    bullet "- title: content (url)". Query yang gagal di-skip saja; agent
+    masih bisa search sendiri untuk area yang kosong.
+    """
+    metrics = list(PREFETCH_QUERIES)
+    responses = await asyncio.gather(
+        *(
+            tavily_search.ainvoke({"query": PREFETCH_QUERIES[m].format(region=region)})
+            for m in metrics
+        ),
+        return_exceptions=True,
+    )
+
+    sections = []
+    for metric, response in zip(metrics, responses):
+        if isinstance(response, Exception) or not isinstance(response, dict):
+            continue
+        hits = response.get("results", [])[:max_hits]
+        if not hits:
+            continue
+        lines = [
+            f"- {h.get('title', '')}: {h.get('content', '')[:400]} ({h.get('url', '')})"
+            for h in hits
+        ]
+        sections.append(f"[{metric.upper()}]\n" + "\n".join(lines))
+    return "\n\n".join(sections)
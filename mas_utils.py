@@ -0,0 +1,84 @@
+# mas_utils.py
+from typing import Dict, List
+
+
+def compute_allocation(
+    regions: List[Dict],
+    wd: float,
+    we: float,
+    wc: float,
+) -> List[Dict]:
+    """
+    Hitung MAS_r dan Allocation_share per region dari skor D/E/C hasil supervisor.
+
+        MAS_r = (D_r * w_d) + (E_r * w_e) + (C_r * w_c)
+        Allocation_r = MAS_r / sum_over_regions(MAS)
+
+    Murni aritmetika, jadi aman dipanggil ulang setiap slider bobot digeser.
+    """
+    rows = []
+    for r in regions:
+        mas = r["demand"] * wd + r["economic"] * we + r["cost"] * wc
+        rows.append({**r, "mas": mas})
+
+    total_mas = sum(row["mas"] for row in rows) or 1.0
+    for row in rows:
+        row["allocation"] = row["mas"] / total_mas
+    return rows
+
+
+def render_allocation_markdown(
+    analysis: Dict,
+    wd: float,
+    we: float,
+    wc: float,
+) -> str:
+    """
+    Render hasil supervisor (AllocationAnalysis.model_dump()) jadi jawaban markdown:
+    - tabel Region | D_r | E_r | C_r | MAS_r | Allocation_share
+    - penjelasan + sumber per region
+    - rekomendasi region prioritas
+    """
+    rows = compute_allocation(analysis.get("regions", []), wd, we, wc)
+    if not rows:
+        return "Tidak ada region yang bisa dianalisis dari pertanyaan tersebut."
+    if not sum(row["mas"] for row in rows):
+        # Semua MAS_r = 0 -> share 0% semua dan rekomendasi cuma urutan tie
+        return (
+            f"Bobot MAS: w_d = {wd:.2f}, w_e = {we:.2f}, w_c = {wc:.2f}\n\n"
+            "⚠️ Total MAS semua region = 0, alokasi tidak bisa dihitung. "
+            "Cek bobot MAS atau skor D/E/C dari agent."
+        )
+
+    lines = [
+        f"Bobot MAS: w_d = {wd:.2f}, w_e = {we:.2f}, w_c = {wc:.2f}",
+        "",
+        "| Region | Demand Factor(D_r) | Economic Factor(E_r) | Cost Factor(C_r) | MAS_r | Allocation_share |",
+        "|---|---|---|---|---|---|",
+    ]
+    for row in rows:
+        lines.append(
+            f"| {row['region']} | {row['demand']:.2f} | {row['economic']:.2f} "
+            f"| {row['cost']:.2f} | {row['mas']:.3f} | {row['allocation']:.1%} |"
+        )
+
+    for row in rows:
+        lines += ["", f"### {row['region']}"]
+        lines += [f"- {point}" for point in row.get("explanation", [])]
+        if row.get("sources"):
+            lines.append("- Sources: " + ", ".join(row["sources"]))
+
+    ranked = sorted(rows, key=lambda row: row["mas"], reverse=True)
+    top = ranked[0]
+    recommendation = (
+        f"Recommendation: prioritaskan **{top['region']}** "
+        f"(MAS_r = {top['mas']:.3f}, alokasi {top['allocation']:.1%})"
+    )
+    if len(ranked) > 1:
+        recommendation += ", diikuti " + ", ".join(row["region"] for row in ranked[1:])
+    lines += ["", recommendation + "."]
+
+    if analysis.get("notes"):
+        lines += ["", f"Notes: {analysis['notes']}"]
+
+    return "\n".join(lines)
@@ -1,11 +1,13 @@
 # pdf_utils.py
 import io
 import re
-from typing import List
+from enum import Enum
+from typing import Iterator, List, Tuple
 
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.pdfbase.pdfmetrics import stringWidth
 from reportlab.platypus import (
     SimpleDocTemplate,
     Paragraph,
@@ -15,23 +17,27 @@ from reportlab.platypus import (
 )
 
 
+# Karakter unicode -> ASCII, dipakai _clean_text (satu pass str.translate)
+_CLEAN_TABLE = str.maketrans({
+    "–": "-",   # en dash
+    "—": "-",   # em dash
+    "•": "-",   # bullet
+    "·": "-",   # middle dot
+    "\u00a0": " ",  # non-breaking space
+    "\u2011": "-",  # non-breaking hyphen (macro-driven, dll)
+})
+
+# **bold** markdown, di-compile sekali di level modul
+_BOLD_RE = re.compile(r"\*\*(.+?)\*\*")
+
+
 def _clean_text(text: str) -> str:
     """
     Normalise characters that are not well-supported by built-in Type 1 fonts.
     Kita tetap pakai Helvetica / Times / Courier (tanpa TTF),
     jadi aman kalau unicode 'aneh' di-map ke ASCII.
     """
-    replacements = {
-        "–": "-",   # en dash
-        "—": "-",   # em dash
-        "•": "-",   # bullet
-        "·": "-",   # middle dot
-        "\u00a0": " ",  # non-breaking space
-        "\u2011": "-",  # non-breaking hyphen (macro-driven, dll)
-    }
-    for src, tgt in replacements.items():
-        text = text.replace(src, tgt)
-    return text
+    return text.translate(_CLEAN_TABLE)
 
 
 def _convert_markdown_bold_to_html(text: str) -> str:
@@ -40,47 +46,98 @@ def _convert_markdown_bold_to_html(text: str) -> str:
     Paragraph ReportLab support subset HTML: <b>, <i>, <u>, <font>, <br/>, dll.
     """
     # Replace **text** with <b>text</b>
-    return re.sub(r"\*\*(.+?)\*\*", r"<b>\1</b>", text)
+    return _BOLD_RE.sub(r"<b>\1</b>", text)
 
 
-def _is_markdown_table(block: str) -> bool:
-    """
-    Heuristik: anggap block sebagai markdown table jika
-    ada minimal 2 baris non-separator yang mulai dengan '|'.
-    """
-    lines = [ln.strip() for ln in block.splitlines() if ln.strip()]
-    if len(lines) < 2:
-        return False
-    pipe_lines = [ln for ln in lines if ln.startswith("|")]
-    if len(pipe_lines) < 2:
-        return False
-    # cek ada baris data (bukan cuma |---|)
-    for ln in pipe_lines:
-        inner = ln.strip("|").strip()
-        if not inner:
-            continue
-        if set(inner) <= set("-:"):  # separator
-            continue
-        return True
-    return False
+class BlockKind(Enum):
+    PARA = "para"
+    TABLE = "table"
+    HEADING = "heading"
+
+
+# Cell tabel yang mengandung inline HTML (<b>, <br/>, ...) wajib lewat Paragraph
+_HAS_HTML = re.compile(r"<[^>]+>")
 
+# Padding kiri/kanan cell tabel (pt), default ReportLab
+_CELL_PADDING = 6
 
-def _parse_markdown_table(block: str) -> List[List[str]]:
+# Hapus '-' dan ':'; baris separator tabel (|---|:---:|) jadi string kosong
+_SEP_KILL = str.maketrans("", "", "-:")
+
+# '# '..'#### ' di awal baris
+_HEADING_RE = re.compile(r"(#{1,4}) ")
+
+
+def iter_blocks(text: str) -> Iterator[Tuple[BlockKind, object]]:
     """
-    Parse markdown table gaya GitHub jadi list 2D cell string.
+    Parse markdown-ish text dalam satu pass line-by-line, emit (kind, payload):
+    - (HEADING, (level, text))
+    - (TABLE, rows)   -> list 2D cell string, baris separator (|---|) sudah dibuang
+    - (PARA, lines)   -> baris-baris paragraf (bullet di-handle saat render)
+
+    Baris kosong menutup paragraf. Baris yang mulai dengan '|' masuk tabel;
+    kalau cuma 1 baris '|' (atau tidak ada baris data), dianggap paragraf biasa.
     """
+    para: List[str] = []
+    table_lines: List[str] = []
     rows: List[List[str]] = []
-    for line in block.splitlines():
-        line = line.strip()
-        if not line.startswith("|"):
+
+    def close_table():
+        # Tabel valid = minimal 2 baris '|' dan ada baris data; selain itu paragraf
+        nonlocal para, table_lines, rows
+        if len(table_lines) >= 2 and rows:
+            yield BlockKind.TABLE, rows
+        else:
+            para += table_lines
+        table_lines, rows = [], []
+
+    for line in text.splitlines():
+        # ---------- BLANK LINE ----------
+        # Dicek tanpa strip(); run baris kosong beruntun otomatis collapse
+        # karena blok kosong tidak pernah di-emit.
+        if not line or line.isspace():
+            if table_lines:
+                yield from close_table()
+            if para:
+                yield BlockKind.PARA, para
+                para = []
             continue
-        cells = [c.strip() for c in line.strip("|").split("|")]
-        # skip baris separator alignment (|---|:---:|---|)
-        inner = "".join(cells)
-        if inner and set(inner) <= set("-:"):
+
+        stripped = line.strip()
+
+        # ---------- TABLE ROW ----------
+        if stripped.startswith("|"):
+            if para:
+                yield BlockKind.PARA, para
+                para = []
+            table_lines.append(line)
+            cells = [c.strip() for c in stripped.strip("|").split("|")]
+            # skip baris separator alignment (|---|:---:|---|)
+            inner = "".join(cells)
+            is_sep = bool(inner) and not inner.translate(_SEP_KILL)
+            if not is_sep:
+                rows.append(cells)
+            continue
+
+        if table_lines:
+            yield from close_table()
+
+        # ---------- HEADING ----------
+        match = _HEADING_RE.match(stripped)
+        if match:
+            if para:
+                yield BlockKind.PARA, para
+                para = []
+            level = len(match.group(1))
+            yield BlockKind.HEADING, (level, stripped[match.end():].strip())
             continue
-        rows.append(cells)
-    return rows
+
+        para.append(line)
+
+    if table_lines:
+        yield from close_table()
+    if para:
+        yield BlockKind.PARA, para
 
 
 def build_pdf_bytes(
@@ -204,51 +261,61 @@ def build_pdf_bytes(
     if title:
         story.append(Paragraph(_clean_text(title), heading1))
 
-    # 2) Pecah jadi blok berdasarkan double newline
-    blocks = text.split("\n\n")
+    headings = {1: heading1, 2: heading2, 3: heading3, 4: heading4}
 
-    for raw_block in blocks:
-        block = raw_block.strip()
-        if not block:
-            continue
+    # Style cell tabel (Paragraph untuk cell yang perlu wrap / HTML)
+    header_style = ParagraphStyle(
+        "TableHeader",
+        parent=body,
+        fontName="Helvetica-Bold",
+        alignment=1,  # center
+        spaceBefore=0,
+        spaceAfter=0,
+    )
+    cell_style = ParagraphStyle(
+        "TableCell",
+        parent=body,
+        alignment=1,  # center
+        spaceBefore=0,
+        spaceAfter=0,
+    )
 
-        # ---------- TABLE ----------
-        if _is_markdown_table(block):
-            data = _parse_markdown_table(block)
-            if not data:
-                continue
-
-            # Wrap cell dengan Paragraph supaya text bisa wrap
-            header_style = ParagraphStyle(
-                "TableHeader",
-                parent=body,
-                fontName="Helvetica-Bold",
-                alignment=1,  # center
-                spaceBefore=0,
-                spaceAfter=0,
-            )
-            cell_style = ParagraphStyle(
-                "TableCell",
-                parent=body,
-                alignment=1,  # center
-                spaceBefore=0,
-                spaceAfter=0,
-            )
+    # 2) Satu pass atas teks: heading / tabel / paragraf
+    for kind, payload in iter_blocks(text):
 
-            table_data: List[List[Paragraph]] = []
-            for row_idx, row in enumerate(data):
-                row_cells: List[Paragraph] = []
+        # ---------- TABLE ----------
+        if kind is BlockKind.TABLE:
+            # Lebar wajar per kolom; cell plain yang muat dibiarkan str (tanpa parse
+            # Paragraph), sisanya (ada HTML / perlu wrap) tetap jadi Paragraph.
+            n_cols = max(len(row) for row in payload)
+            max_plain_width = doc.width / n_cols - 2 * _CELL_PADDING
+
+            table_data: List[List[object]] = []
+            for row_idx, row in enumerate(payload):
+                style = header_style if row_idx == 0 else cell_style
+                row_cells: List[object] = []
                 for cell in row:
                     cell_text = cell or ""
-                    if row_idx == 0:
-                        row_cells.append(Paragraph(cell_text, header_style))
+                    if _HAS_HTML.search(cell_text) or stringWidth(
+                        cell_text, style.fontName, style.fontSize
+                    ) > max_plain_width:
+                        row_cells.append(Paragraph(cell_text, style))
                     else:
-                        row_cells.append(Paragraph(cell_text, cell_style))
+                        row_cells.append(cell_text)
                 table_data.append(row_cells)
 
             tbl = Table(table_data, hAlign="LEFT")
             tbl_style = TableStyle(
                 [
+                    # font & alignment untuk cell plain str
+                    ("FONTNAME", (0, 0), (-1, 0), header_style.fontName),
+                    ("FONTNAME", (0, 1), (-1, -1), cell_style.fontName),
+                    ("FONTSIZE", (0, 0), (-1, -1), body_font_size),
+                    ("LEADING", (0, 0), (-1, -1), body_leading),
+                    ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+                    ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+                    ("LEFTPADDING", (0, 0), (-1, -1), _CELL_PADDING),
+                    ("RIGHTPADDING", (0, 0), (-1, -1), _CELL_PADDING),
                     # header row
                     ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#f3f4f6")),
                     ("TEXTCOLOR", (0, 0), (-1, 0), colors.HexColor("#111827")),
@@ -268,27 +335,12 @@ def build_pdf_bytes(
             continue
 
         # ---------- HEADINGS ----------
-        if block.startswith("#### "):
-            txt = block[4:].strip()
-            story.append(Paragraph(txt, heading4))
-            continue
-
-        if block.startswith("### "):
-            txt = block[4:].strip()
-            story.append(Paragraph(txt, heading3))
-            continue
-
-        if block.startswith("## "):
-            txt = block[3:].strip()
-            story.append(Paragraph(txt, heading2))
-            continue
-
-        if block.startswith("# "):
-            txt = block[2:].strip()
-            story.append(Paragraph(txt, heading1))
+        if kind is BlockKind.HEADING:
+            level, txt = payload
+            story.append(Paragraph(txt, headings[level]))
             continue
 
-        lower = block.lower()
+        lower = payload[0].lstrip().lower()
 
         # ---------- HIGHLIGHT SUMMARY / RECOMMENDATION ----------
         if (
@@ -296,14 +348,14 @@ def build_pdf_bytes(
             or lower.startswith("ringkasan")
             or lower.startswith("recommendation")
         ):
-            lines = [ln.rstrip() for ln in block.splitlines()]
+            lines = [ln.rstrip() for ln in payload]
             html_text = "<br/>".join(lines)
             story.append(Paragraph(html_text, summary_style))
             continue
 
         # ---------- NORMAL PARAGRAPH & BULLETS ----------
         lines = []
-        for line in block.splitlines():
+        for line in payload:
             stripped = line.strip()
             if stripped.startswith("- "):
                 lines.append("• " + stripped[2:].strip())
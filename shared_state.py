@@ -1,39 +1,56 @@
 from langchain_openai import ChatOpenAI
-from dotenv import load_dotenv
 from langchain.agents.middleware import wrap_model_call, ModelRequest
-from typing import Callable
-import os
-load_dotenv()
-OPENAI_API_KEY = os.environ.get("OPEN_AI_API_KEY")
+from typing import Awaitable, Callable
+import httpx
 
+from config import OPENAI_API_KEY
+
+# Satu connection pool HTTP/2 (keep-alive, multiplexing) untuk semua request OpenAI,
+# dipakai bersama thinking_model & standard_model. Async client terikat ke event loop
+# tempat koneksinya dibuka, jadi agent dijalankan di satu loop long-lived (lihat app.py).
+# Timeout longgar karena reasoning model bisa lama sebelum respon pertama.
+_HTTP_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=16)
+_HTTP_TIMEOUT = httpx.Timeout(120.0, connect=10.0)
+
+http_client = httpx.Client(http2=True, limits=_HTTP_LIMITS, timeout=_HTTP_TIMEOUT)
+http_async_client = httpx.AsyncClient(http2=True, limits=_HTTP_LIMITS, timeout=_HTTP_TIMEOUT)
+
+# Jangan ganti ke standard_model.bind(model=...): create_agent memanggil
+# bind_tools() yang membuang kwargs bind sebelumnya (model & reasoning_effort hilang).
 thinking_model = ChatOpenAI(
     model="gpt-5.1-2025-11-13",
     api_key=OPENAI_API_KEY,
     reasoning_effort="medium",
+    http_client=http_client,
+    http_async_client=http_async_client,
 )
 
 standard_model = ChatOpenAI(
     model="gpt-4.1-2025-04-14",
     api_key=OPENAI_API_KEY,
     temperature=0.0,
+    http_client=http_client,
+    http_async_client=http_async_client,
 )
 
 @wrap_model_call
-def choose_model(
+async def choose_model(
     request: ModelRequest,
-    handler: Callable[[ModelRequest], "ModelResponse"],
+    handler: Callable[[ModelRequest], Awaitable["ModelResponse"]],
 ):
     """
     Baca request.runtime.context["mode"] yang dikirim dari Streamlit.
 
     - "thinking"  -> pakai gpt-5
     - "standard"  -> pakai gpt-4.1 (default)
+
+    Async karena semua agent dijalankan lewat .ainvoke().
+    Semua agent dibangun dengan standard_model, jadi mode default langsung
+    diteruskan tanpa mengubah request sama sekali.
     """
-    mode = request.runtime.context.get("mode", "standard")
+    mode = (request.runtime.context or {}).get("mode", "standard")
 
-    if mode == "thinking":
-        request.model = thinking_model
-    else:
-        request.model = standard_model
+    if mode == "thinking" and request.model is not thinking_model:
+        request = request.override(model=thinking_model)
 
-    return handler(request)
\ No newline at end of file
+    return await handler(request)
\ No newline at end of file
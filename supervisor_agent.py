@@ -1,74 +1,63 @@
 # supervisor_fmcg.py
-from langchain.tools import tool
+from langchain.tools import tool, ToolRuntime
 from langchain.chat_models import init_chat_model
 from langchain_openai import ChatOpenAI
 from langchain.agents import create_agent
 from langchain.agents.middleware import ToolRetryMiddleware
-from dotenv import load_dotenv
-from typing import Callable
+from typing import Callable, List
+from pydantic import BaseModel, Field
+from cachetools import TTLCache
 
 from shared_state import choose_model, thinking_model, standard_model
-import os
-load_dotenv()
-OPENAI_API_KEY = os.environ.get("OPEN_AI_API_KEY")
-TAVILY_API_KEY = os.environ.get("TAVILY_API_KEY")
-
-from fmcg_agent import (
-    gdp_agent,
-    inflation_agent,
-    fuel_agent,
-    sentiment_agent,
-    population_agent,
-    urbanization_agent,
-)
+from config import OPENAI_API_KEY, TAVILY_API_KEY
 
-@tool
-def get_gdp_context(region: str) -> str:
-    """Get GDP level & growth for given region/country and its implication for FMCG demand."""
-    result = gdp_agent.invoke({
-        "messages": [{"role": "user", "content": f"Analyze GDP for {region}."}]
-    })
-    return result["messages"][-1].text
-
-@tool
-def get_inflation_context(region: str) -> str:
-    """Get inflation for given region/country and its implication for FMCG demand."""
-    result = inflation_agent.invoke({
-        "messages": [{"role": "user", "content": f"Analyze inflation for {region}."}]
-    })
-    return result["messages"][-1].text
+from fmcg_agent import macro_profile_agent, prefetch_macro_snippets
 
-@tool
-def get_fuel_context(region: str) -> str:
-    """Get fuel/oil price info and logistics implication for FMCG distribution."""
-    result = fuel_agent.invoke({
-        "messages": [{"role": "user", "content": f"Analyze fuel and logistics cost for {region}."}]
-    })
-    return result["messages"][-1].text
-
-@tool
-def get_sentiment_context(region: str) -> str:
-    """Get consumer sentiment index and implications for FMCG."""
-    result = sentiment_agent.invoke({
-        "messages": [{"role": "user", "content": f"Analyze consumer sentiment for {region}."}]
-    })
-    return result["messages"][-1].text
+# Cache macro profile per (region, mode). Data makro berubah pelan,
+# jadi TTL 1 jam aman; region yang sama tidak perlu Tavily + LLM ulang.
+_profile_cache: TTLCache = TTLCache(maxsize=512, ttl=3600)
 
-@tool
-def get_population_context(region: str) -> str:
-    """Get population level/growth/density and implications for FMCG."""
-    result = population_agent.invoke({
-        "messages": [{"role": "user", "content": f"Analyze population for {region}."}]
-    })
-    return result["messages"][-1].text
 
 @tool
-def get_urbanization_context(region: str) -> str:
-    """Get urbanization level and implications for FMCG & channel mix."""
-    result = urbanization_agent.invoke({
-        "messages": [{"role": "user", "content": f"Analyze urbanization for {region}."}]
+async def get_macro_profile(region: str, runtime: ToolRuntime) -> str:
+    """Get GDP, inflation, fuel/logistics, consumer sentiment, population and urbanization
+    for given region/country, with FMCG implications and sources, as one JSON profile."""
+    mode = (runtime.context or {}).get("mode", "standard")
+    key = (region.lower().strip(), mode)
+    # Tanpa lock: tool ini hanya jalan di satu thread (event loop agent)
+    cached = _profile_cache.get(key)
+    if cached is not None:
+        return cached
+
+    question = f"Build the macro profile for {region}."
+    snippets = await prefetch_macro_snippets(region)
+    if snippets:
+        question += "\n\nPre-fetched search results:\n\n" + snippets
+
+    result = await macro_profile_agent.ainvoke({
+        "messages": [{"role": "user", "content": question}]
     })
-    return result["messages"][-1].text
+    # Serialisasi lewat pydantic-core (Rust), tidak lewat stdlib json. Sengaja tidak
+    # monkey-patch json global ke orjson: signature-nya beda (indent/default/cls).
+    profile = result["structured_response"].model_dump_json()
+    _profile_cache[key] = profile
+    return profile
+
+# STRUCTURED OUTPUT
+# Supervisor hanya mengembalikan D_r / E_r / C_r per region. MAS & alokasi dihitung
+# di app (mas_utils.py), jadi ganti bobot tidak perlu memanggil LLM lagi.
+class RegionScore(BaseModel):
+    region: str = Field(description="Region / country name")
+    demand: float = Field(description="Demand Factor D_r, normalized 0-1")
+    economic: float = Field(description="Economic Factor E_r, normalized 0-1")
+    cost: float = Field(description="Cost Factor C_r, normalized 0-1 (higher = better)")
+    explanation: List[str] = Field(description="2-3 short bullets explaining the scores")
+    sources: List[str] = Field(description="2-3 source URLs")
+
+
+class AllocationAnalysis(BaseModel):
+    regions: List[RegionScore]
+    notes: str = Field(description="Data years and economic assumptions used")
 
 # SUPERVISOR PROMPT
 # FMCG_SUPERVISOR_PROMPT = """
@@ -104,26 +93,24 @@ def get_urbanization_context(region: str) -> str:
 FMCG_SUPERVISOR_PROMPT = """
 You are a senior FMCG allocation strategist.
 
-You have tools to retrieve:
-- GDP & GDP growth (get_gdp_context)
-- Inflation (get_inflation_context)
-- Fuel / logistics cost (get_fuel_context)
-- Consumer sentiment (get_sentiment_context)
-- Population growth & density (get_population_context)
-- Urbanization level (get_urbanization_context)
+You have one tool, get_macro_profile, which returns a JSON macro profile for a region:
+- GDP & GDP growth
+- Inflation
+- Fuel / logistics cost
+- Consumer sentiment
+- Population growth & density
+- Urbanization level
+plus source URLs.
 
 Your main task:
-1. For each region mentioned by the user, call the tools needed to build a macro profile
-   (GDP growth, inflation, sentiment, population, urbanization, fuel/logistics, etc.).
+1. For each region mentioned by the user, call get_macro_profile exactly once.
+   The calls are independent of each other, so emit ALL of them in a single assistant turn
+   as one parallel tool_calls array (one call per region).
+   Do not wait for one tool result before calling the next one.
 2. From these signals, derive three normalized scores in range [0, 1] for each region:
    - Demand Factor D_r
    - Economic Factor E_r
    - Cost Factor C_r
-3. Then compute Market Allocation Score (MAS_r) using the following formula:
-
-   MAS_r = (D_r * w_d) + (E_r * w_e) + (C_r * w_c)
-
-   where w_d, w_e, w_c are weights provided by the user in the prompt.
 
    Interpretation:
    - D_r (Demand): combines historical sales momentum, population density/growth,
@@ -132,16 +119,21 @@ Your main task:
    - C_r (Cost): combines logistics cost (fuel prices, infrastructure efficiency) 
      and margin potential (higher margin = better score, higher fuel price = worse score).
 
-4. After computing MAS_r for each region, convert them into allocation proportions:
+   Scores must be comparable across regions (same scale for every region).
 
+3. Do NOT compute MAS_r or allocation shares yourself. The application applies the
+   user's weights locally:
+
+   MAS_r = (D_r * w_d) + (E_r * w_e) + (C_r * w_c)
    Allocation_r = MAS_r / sum_over_regions(MAS)
 
-5. In your final answer, always return:
-   - A markdown table with columns:
-     Region | D_r | E_r | C_r | MAS_r | Allocation_share
-   - Short explanation (2-3 bullets) per region about why the score looks like that.
-   - A short recommendation on which region should be prioritized and why.
-   - Include at least 2-3 source URLs per region.
+   so your scores must not depend on any weights mentioned by the user.
+
+4. Return the structured response with, for every region:
+   - region name, D_r, E_r, C_r
+   - short explanation (2-3 bullets) about why the scores look like that
+   - at least 2-3 source URLs
+   plus short notes on data years and economic assumptions.
 
 Always be explicit about data years and economic assumptions.
 Use at least 2-3 reputable sources per region (World Bank, IMF, national statistics, etc.).
@@ -160,25 +152,27 @@ Use at least 2-3 reputable sources per region (World Bank, IMF, national statist
 #                     reasoning_effort="low",
 #                 )
 
-fmcg_supervisor_agent = create_agent(
-    standard_model,
-    tools=[
-        get_gdp_context,
-        get_inflation_context,
-        get_fuel_context,
-        get_sentiment_context,
-        get_population_context,
-        get_urbanization_context,
-    ],
-    system_prompt=FMCG_SUPERVISOR_PROMPT,
-    middleware=[choose_model]
-    # middleware=[choose_model, 
-    #             ToolRetryMiddleware(
-    #                 max_retries=2,
-    #                 backoff_factor=2.0,
-    #                 initial_delay=1.0,
-    #             )]
-)
+# Tool calls dari satu assistant turn di-dispatch sebagai task terpisah dalam satu
+# superstep LangGraph, jadi dijalankan concurrent (parallel_tool_calls default True
+# di ChatOpenAI). Latency per turn = tool paling lambat, bukan jumlah semuanya.
+def build_supervisor():
+    """
+    Bangun FMCG supervisor agent.
+    Dipanggil sekali per proses dari app.py (st.cache_resource), bukan tiap rerun.
+    """
+    return create_agent(
+        standard_model,
+        tools=[get_macro_profile],
+        system_prompt=FMCG_SUPERVISOR_PROMPT,
+        response_format=AllocationAnalysis,
+        middleware=[choose_model]
+        # middleware=[choose_model, 
+        #             ToolRetryMiddleware(
+        #                 max_retries=2,
+        #                 backoff_factor=2.0,
+        #                 initial_delay=1.0,
+        #             )]
+    )
 
 # if __name__ == "__main__":
 #     query = (
@@ -186,8 +180,14 @@ fmcg_supervisor_agent = create_agent(
 #         "Assume we are an FMCG company in 2025 deciding where to prioritize marketing & distribution."
 #     )
 
-#     for step in fmcg_supervisor_agent.stream(
-#         {"messages": [{"role": "user", "content": query}]},
-#         stream_mode="values",
-#     ):
-#         step["messages"][-1].pretty_print()
+#     # get_macro_profile & choose_model async-only, jadi harus lewat .astream
+#     import asyncio
+
+#     async def main():
+#         async for step in build_supervisor().astream(
+#             {"messages": [{"role": "user", "content": query}]},
+#             stream_mode="values",
+#         ):
+#             step["messages"][-1].pretty_print()
+
+#     asyncio.run(main())